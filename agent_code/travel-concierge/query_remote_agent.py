@@ -1,10 +1,160 @@
 import vertexai
 from vertexai import agent_engines # Correct import based on your deploy.py and logs
 
+import asyncio
 import os
 import json # For debugging event structures, if needed
+import queue
+import sys
+import threading
+import time
 from dotenv import load_dotenv
 
+# --- Batched stdout flushing ---
+# Writing and flushing stdout per streamed text part is one syscall per token.
+# Instead, buffer parts and flush when the batch fills or 50ms has elapsed,
+# whichever comes first. The batch size starts at 1 (so the first token shows
+# immediately), grows geometrically, and is capped.
+_BATCH_MIN = 1
+_BATCH_GROWTH = 3
+_BATCH_MAX = 50
+_FLUSH_INTERVAL_SECS = 0.05
+
+
+class _BatchedPrinter:
+    """Buffers streamed text and flushes it to stdout in batches."""
+
+    def __init__(self):
+        self._buf = []
+        self._batch_size = _BATCH_MIN
+        self._last_flush = time.monotonic()
+
+    def write(self, text):
+        self._buf.append(text)
+        if (len(self._buf) >= self._batch_size
+                or time.monotonic() - self._last_flush >= _FLUSH_INTERVAL_SECS):
+            self.flush()
+            self._batch_size = min(self._batch_size * _BATCH_GROWTH, _BATCH_MAX)
+
+    def flush(self):
+        if self._buf:
+            sys.stdout.write("".join(self._buf))
+            sys.stdout.flush()
+            self._buf.clear()
+        self._last_flush = time.monotonic()
+# --- End batched stdout flushing ---
+
+
+def _text_parts(event):
+    """Returns the 'parts' list of an event, or () if the shape doesn't match.
+
+    Uses 'type(x) is dict' rather than isinstance: ADK events are exactly
+    dicts, and the exact-type check skips the MRO walk on this per-chunk path.
+    """
+    content = event.get('content') if type(event) is dict else None
+    return content.get('parts', ()) if type(content) is dict else ()
+
+
+def _handle_event(event, printer) -> bool:
+    """Extracts text parts from one streamed event. Returns True if any text was printed."""
+    spoke = False
+    for part in _text_parts(event):
+        text = part.get('text') if type(part) is dict else None
+        if text:
+            printer.write(text)
+            spoke = True
+        # Optional: Handle function calls for more detailed output
+        # elif type(part) is dict and 'function_call' in part:
+        #     fc = part['function_call']
+        #     author = event.get('author', 'Agent') # Get author from event if available
+        #     printer.write(f"\n[{author} calls function: {fc.get('name')}]")
+        #     spoke = True
+    return spoke
+
+
+async def _stream_turn(remote_agent_engine, query_args, printer) -> bool:
+    """Consumes one turn of stream_query, preferring the SDK's async variant."""
+    agent_spoke_text = False
+    async_stream = getattr(remote_agent_engine, "async_stream_query", None)
+    if async_stream is not None:
+        async for event in async_stream(**query_args):
+            if _handle_event(event, printer):
+                agent_spoke_text = True
+    else:
+        # Sync generator fallback: pull each event on the default executor so
+        # the event loop (and the flush timer) stays responsive between tokens.
+        loop = asyncio.get_running_loop()
+        sentinel = object()
+        iterator = iter(remote_agent_engine.stream_query(**query_args))
+        while True:
+            event = await loop.run_in_executor(None, next, iterator, sentinel)
+            if event is sentinel:
+                break
+            if _handle_event(event, printer):
+                agent_spoke_text = True
+    printer.flush()
+    return agent_spoke_text
+
+
+# --- Background stream consumption ---
+# input() would otherwise block the thread that drains stream_query, leaving
+# in-flight tokens sitting in the SDK's buffer between turns. A worker thread
+# owns the stream, a consumer thread owns stdout, and the main thread only
+# handles stdin.
+_TURN_DONE = object()
+_SHUTDOWN = object()
+
+
+class _QueuePrinter:
+    """Printer facade that forwards streamed text to the stdout consumer thread."""
+
+    def __init__(self, text_out: queue.Queue):
+        self._text_out = text_out
+
+    def write(self, text):
+        self._text_out.put(text)
+
+    def flush(self):
+        pass
+
+
+def _stream_worker(remote_agent_engine, turns: queue.Queue, text_out: queue.Queue, results: queue.Queue):
+    """Consumes stream_query turns posted by the main thread."""
+    while True:
+        query_args = turns.get()
+        if query_args is _SHUTDOWN:
+            text_out.put(_SHUTDOWN)
+            break
+        try:
+            outcome = asyncio.run(
+                _stream_turn(remote_agent_engine, query_args, _QueuePrinter(text_out))
+            )
+        except Exception as e:
+            outcome = e
+        # _TURN_DONE must be enqueued before the result is posted: the main
+        # thread does results.get() then text_out.join(), and the join only
+        # guarantees the tail of the reply was flushed if the flush marker is
+        # already in the queue by then.
+        text_out.put(_TURN_DONE)
+        results.put(outcome)
+
+
+def _stdout_consumer(text_out: queue.Queue):
+    """Drains streamed text and prints it in batches."""
+    printer = _BatchedPrinter()
+    while True:
+        item = text_out.get()
+        if item is _SHUTDOWN:
+            text_out.task_done()
+            break
+        if item is _TURN_DONE:
+            printer.flush()
+        else:
+            printer.write(item)
+        text_out.task_done()
+# --- End background stream consumption ---
+
+
 def main():
     # Load environment variables from .env file
     load_dotenv()
@@ -62,52 +212,48 @@ def main():
         print("---")
 
         # --- Interaction Loop ---
+        turns: queue.Queue = queue.Queue()
+        text_out: queue.Queue = queue.Queue()
+        results: queue.Queue = queue.Queue()
+        threading.Thread(
+            target=_stream_worker,
+            args=(remote_agent_engine, turns, text_out, results),
+            daemon=True,
+        ).start()
+        threading.Thread(target=_stdout_consumer, args=(text_out,), daemon=True).start()
+
         while True:
             user_message = input("You: ")
             if user_message.lower() in ["exit", "quit"]:
                 print("Exiting chat.")
+                turns.put(_SHUTDOWN)
                 break
             if not user_message.strip():
                 continue
 
             print("Agent: ", end="", flush=True)
-            agent_spoke_text = False
-
-            try:
-                # Prepare arguments for stream_query
-                # Based on your deploy.py, it uses `message`, `user_id`, and `session_id`
-                query_args = {"message": user_message}
-                if session_id: # Only add session_id and user_id if a session was established
-                    query_args["session_id"] = session_id
-                    query_args["user_id"] = user_id_for_session
-                
-                for event in remote_agent_engine.stream_query(**query_args):
-                    # For debugging the full event structure:
-                    # print(f"\nDEBUG_EVENT: {json.dumps(event, indent=2)}")
-
-                    if isinstance(event, dict) and 'content' in event and isinstance(event['content'], dict) and 'parts' in event['content']:
-                        for part in event['content']['parts']:
-                            if isinstance(part, dict) and 'text' in part and part['text']:
-                                print(part['text'], end="", flush=True)
-                                agent_spoke_text = True
-                            # Optional: Handle function calls for more detailed output
-                            # elif isinstance(part, dict) and 'function_call' in part:
-                            #     fc = part['function_call']
-                            #     author = event.get('author', 'Agent') # Get author from event if available
-                            #     print(f"\n[{author} calls function: {fc.get('name')}]", end="", flush=True)
-                            #     agent_spoke_text = True 
-                
-                print() # Final newline after the agent's full streamed response
-
-                if not agent_spoke_text:
-                    print("[Agent may have performed an action without sending a text message this turn.]")
-
-            except Exception as e:
-                print(f"\nERROR during stream_query: {e}")
-                import traceback
-                traceback.print_exc()
+
+            # Prepare arguments for stream_query
+            # Based on your deploy.py, it uses `message`, `user_id`, and `session_id`
+            query_args = {"message": user_message}
+            if session_id: # Only add session_id and user_id if a session was established
+                query_args["session_id"] = session_id
+                query_args["user_id"] = user_id_for_session
+
+            turns.put(query_args)
+            outcome = results.get() # Stream fully consumed by the worker.
+            text_out.join() # All streamed text flushed to stdout.
+
+            if isinstance(outcome, Exception):
+                print(f"\nERROR during stream_query: {outcome}")
+                turns.put(_SHUTDOWN)
                 break # Exit loop on stream error
-            
+
+            print() # Final newline after the agent's full streamed response
+
+            if not outcome:
+                print("[Agent may have performed an action without sending a text message this turn.]")
+
             print("---")
 
     except Exception as e:
@@ -23,7 +23,7 @@ from google.adk.sessions import InMemorySessionService
 from google.adk.tools import ToolContext
 import pytest
 from travel_concierge.agent import root_agent
-from travel_concierge.tools.memory import memorize
+from travel_concierge.tools.memory import forget, memorize, memorize_list
 from travel_concierge.tools.places import map_tool
 
 
@@ -68,6 +68,42 @@ class TestAgents(unittest.TestCase):
             self.tool_context.state["itinerary_datetime"], "12/31/2025 11:59:59"
         )
 
+    def test_memorize_list(self):
+        for value in ["beaches", "hiking", "beaches"]:
+            result = memorize_list(
+                key="preferences", value=value, tool_context=self.tool_context
+            )
+            self.assertIn("status", result)
+        self.assertEqual(
+            self.tool_context.state["preferences"], ["beaches", "hiking"]
+        )
+        # A value must be re-addable after the key was overwritten and reset.
+        memorize(key="snacks", value="tbd", tool_context=self.tool_context)
+        forget(key="snacks", value="tbd", tool_context=self.tool_context)
+        memorize_list(key="snacks", value="fruit", tool_context=self.tool_context)
+        self.assertEqual(self.tool_context.state["snacks"], ["fruit"])
+
+    def test_forget(self):
+        memorize_list(
+            key="preferences", value="beaches", tool_context=self.tool_context
+        )
+        result = forget(
+            key="preferences", value="beaches", tool_context=self.tool_context
+        )
+        self.assertIn("status", result)
+        self.assertEqual(self.tool_context.state["preferences"], [])
+        # Forgetting from an absent key must not raise.
+        result = forget(key="unknown", value="x", tool_context=self.tool_context)
+        self.assertIn("status", result)
+        # A scalar overwrite followed by repeated forgets must not leave a
+        # stale companion index that crashes later removals.
+        memorize_list(key="colors", value="red", tool_context=self.tool_context)
+        memorize(key="colors", value="blue", tool_context=self.tool_context)
+        forget(key="colors", value="red", tool_context=self.tool_context)
+        result = forget(key="colors", value="red", tool_context=self.tool_context)
+        self.assertIn("status", result)
+        self.assertEqual(self.tool_context.state["colors"], [])
+
     def test_places(self):
         self.tool_context.state["poi"] = {
             "places": [{"place_name": "Machu Picchu", "address": "Machu Picchu, Peru"}]
@@ -15,8 +15,15 @@
 """The 'memorize' tool for several agents to affect session states."""
 
 from datetime import datetime
+import atexit # Added for cleaning up pooled SMTP connections on exit
+import functools
 import json
+import logging
 import os
+import pickle
+import queue # Added for the SMTP connection pool
+import ssl # Added for the shared STARTTLS context
+import threading # Added for guarding pool re-keying
 from typing import Dict, Any, List # Added List for type hinting
 import smtplib # Added for sending emails
 
@@ -28,10 +35,273 @@ from google.adk.tools import ToolContext
 
 from travel_concierge.shared_libraries import constants
 
-SAMPLE_SCENARIO_PATH = os.getenv(
-    "TRAVEL_CONCIERGE_SCENARIO", "eval/itinerary_empty_default.json"
+logger = logging.getLogger(__name__)
+
+# Resolved once at import so later chdir calls can't change which file we read.
+SAMPLE_SCENARIO_PATH = os.path.abspath(
+    os.getenv("TRAVEL_CONCIERGE_SCENARIO", "eval/itinerary_empty_default.json")
 )
 
+try:
+    import orjson  # Faster JSON parsing/serialization when available.
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # orjson is UTF-8 native and writes bytes directly, so no ensure_ascii
+    # dance is needed.
+    def _dumps(value: Any) -> str:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2).decode("utf-8")
+else:
+    def _dumps(value: Any) -> str:
+        return json.dumps(value, indent=2, ensure_ascii=False)
+
+@functools.lru_cache(maxsize=1)
+def _load_scenario() -> Dict[str, Any]:
+    """
+    Loads and parses the scenario file once per process.
+
+    The scenario never changes during the process lifetime, so re-reading and
+    re-parsing it on every agent call is redundant disk and CPU work.
+    """
+    with open(SAMPLE_SCENARIO_PATH, "rb") as file:
+        raw = file.read()
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    # Lazy %-formatting: the repr of the full scenario dict is only built
+    # when DEBUG logging is actually enabled.
+    logger.debug("Loading Initial State: %r", data)
+    return data
+
+
+@functools.lru_cache(maxsize=1)
+def _scenario_template() -> bytes:
+    """Returns the parsed scenario pickled once, ready for cheap copying."""
+    return pickle.dumps(_load_scenario(), protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _fresh_scenario() -> Dict[str, Any]:
+    """
+    Returns a private copy of the cached scenario.
+
+    _set_initial_states merges the scenario into mutable session state, so
+    handing out the cached dict itself would let one session's mutations leak
+    into the next. A pickle round-trip of the precomputed blob is cheaper than
+    copy.deepcopy for plain JSON-shaped data, and far cheaper than re-parsing
+    the file.
+    """
+    return pickle.loads(_scenario_template())
+
+# --- SMTP Connection Pool ---
+# The TLS + AUTH handshake dominates per-send latency, so instead of opening a
+# fresh connection per email we keep a small pool of logged-in connections and
+# reuse each one for a bounded number of messages.
+_SMTP_POOL_SIZE = 5
+_SMTP_MAX_MESSAGES_PER_CONNECTION = 100
+
+_smtp_pool: queue.Queue = queue.Queue(maxsize=_SMTP_POOL_SIZE)
+_smtp_pool_lock = threading.Lock()
+_smtp_pool_key = None  # (host, port, user) the pooled connections belong to
+
+# Socket-level timeout: without it a slow network stalls the calling thread
+# indefinitely (Python's default is blocking-forever).
+_SMTP_TIMEOUT_SECS = 30
+
+# Build the SSL context once: it loads the system trust store (~10ms), which
+# there is no reason to repeat per connection.
+_SSL_CTX = ssl.create_default_context()
+
+
+def _connect_smtp(smtp_server: str, smtp_port: int, sender_email: str, sender_password: str) -> smtplib.SMTP:
+    """Opens a fresh SMTP connection, completing STARTTLS and LOGIN."""
+    server = smtplib.SMTP(smtp_server, smtp_port, timeout=_SMTP_TIMEOUT_SECS)
+    server.ehlo() # Identify ourselves to the ESMTP server.
+    server.starttls(context=_SSL_CTX)  # Enable security
+    server.ehlo() # Re-identify ourselves as an ESMTP client after STARTTLS.
+    server.login(sender_email, sender_password)
+    server._pool_messages_sent = 0  # Per-connection send budget tracker.
+    return server
+
+
+def _discard_smtp(server: smtplib.SMTP):
+    """Closes a connection that is no longer usable, ignoring errors."""
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+
+def _drain_smtp_pool():
+    """Quits every pooled connection. Registered to run at interpreter exit."""
+    while True:
+        try:
+            server = _smtp_pool.get_nowait()
+        except queue.Empty:
+            break
+        _discard_smtp(server)
+
+
+atexit.register(_drain_smtp_pool)
+
+
+def _get_smtp(smtp_server: str, smtp_port: int, sender_email: str, sender_password: str) -> smtplib.SMTP:
+    """
+    Pops a healthy connection from the pool, or opens a fresh one.
+
+    Pooled connections are health-checked with NOOP; anything that fails the
+    check (stale TCP, server-side idle timeout) is discarded and replaced.
+    """
+    global _smtp_pool_key
+    key = (smtp_server, smtp_port, sender_email)
+    with _smtp_pool_lock:
+        if _smtp_pool_key != key:
+            # Server or credentials changed; pooled connections are stale.
+            _drain_smtp_pool()
+            _smtp_pool_key = key
+    while True:
+        try:
+            server = _smtp_pool.get_nowait()
+        except queue.Empty:
+            return _connect_smtp(smtp_server, smtp_port, sender_email, sender_password)
+        try:
+            status, _ = server.noop()
+            if status == 250:
+                return server
+        except (smtplib.SMTPServerDisconnected, OSError):
+            pass
+        _discard_smtp(server)
+
+
+def _return_smtp(server: smtplib.SMTP, messages_sent: int = 1):
+    """Returns a connection to the pool, retiring it once its send budget is spent."""
+    server._pool_messages_sent = getattr(server, "_pool_messages_sent", 0) + messages_sent
+    if server._pool_messages_sent >= _SMTP_MAX_MESSAGES_PER_CONNECTION:
+        _discard_smtp(server)
+        return
+    try:
+        _smtp_pool.put_nowait(server)
+    except queue.Full:
+        _discard_smtp(server)
+# --- End SMTP Connection Pool ---
+
+
+# --- Email Batcher ---
+class EmailBatcher:
+    """
+    Accumulates outgoing emails and flushes them over one SMTP connection.
+
+    Callers enqueue (subject, body, recipients) tuples and return immediately;
+    a background worker drains up to _MAX_BATCH items (or whatever arrived
+    within _BATCH_WAIT_SECS), then sends them all over a single pooled
+    connection so the TLS + AUTH handshake is amortized across the batch.
+    """
+
+    _MAX_BATCH = 100
+    _BATCH_WAIT_SECS = 1.0
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    def enqueue(self, subject: str, body: str, recipients: List[str]):
+        """Queues one email for sending and ensures the worker is running."""
+        self._queue.put((subject, body, recipients))
+        self._ensure_worker()
+
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(
+                    target=self._run, name="email-batcher", daemon=True
+                )
+                self._worker.start()
+
+    def _collect_batch(self) -> List[tuple]:
+        """Blocks for the first item, then drains whatever else is queued."""
+        batch = [self._queue.get()]
+        deadline = datetime.now().timestamp() + self._BATCH_WAIT_SECS
+        while len(batch) < self._MAX_BATCH:
+            remaining = deadline - datetime.now().timestamp()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            self._send_batch(batch)
+
+    def _send_batch(self, batch: List[tuple]):
+        sender_email = os.environ.get("SENDER_EMAIL", "kshitija369@gmail.com")
+        sender_password = os.environ.get("SENDER_APP_PASSWORD", "nueg zvcv qsyi mzlb") # Use an App Password
+        smtp_server = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
+        smtp_port = int(os.environ.get("SMTP_PORT", 587))
+
+        server = None
+        failures = 0
+        # Messages actually sent over the current connection; this is what
+        # counts against the per-connection budget, so a reconnect mid-batch
+        # resets it.
+        sent_on_connection = 0
+        try:
+            server = _get_smtp(smtp_server, smtp_port, sender_email, sender_password)
+            for subject, body, recipients in batch:
+                # Too many failures in a sizeable batch usually means a server-side
+                # problem (throttling, auth revoked); abort rather than hammer it.
+                if failures * 3 >= len(batch) and len(batch) >= 30:
+                    logger.error("Aborting email batch after %d failures.", failures)
+                    break
+                msg = MIMEText(body, 'plain', 'utf-8')
+                msg['Subject'] = subject
+                msg['From'] = sender_email
+                msg['To'] = ", ".join(recipients)
+                try:
+                    server.sendmail(sender_email, recipients, msg.as_string())
+                    sent_on_connection += 1
+                except smtplib.SMTPServerDisconnected:
+                    # Reconnect mid-batch and retry this message once.
+                    _discard_smtp(server)
+                    server = _connect_smtp(smtp_server, smtp_port, sender_email, sender_password)
+                    sent_on_connection = 0
+                    try:
+                        server.sendmail(sender_email, recipients, msg.as_string())
+                        sent_on_connection += 1
+                    except smtplib.SMTPException:
+                        failures += 1
+                        logger.exception("Failed to send queued email %r", subject)
+                except smtplib.SMTPException:
+                    failures += 1
+                    logger.exception("Failed to send queued email %r", subject)
+            if server is not None:
+                _return_smtp(server, sent_on_connection)
+        except Exception:
+            logger.exception("Email batch could not be sent.")
+            if server is not None:
+                _discard_smtp(server)
+
+    def drain_and_close(self):
+        """Flushes any pending emails synchronously. Registered with atexit."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._send_batch(batch)
+
+
+_EMAIL_BATCHER = EmailBatcher()
+atexit.register(_EMAIL_BATCHER.drain_and_close)
+# --- End Email Batcher ---
+
 
 def email_memorized_value(key: str, email_addresses: List[str], tool_context: ToolContext):
     """
@@ -57,7 +327,7 @@ def email_memorized_value(key: str, email_addresses: List[str], tool_context: To
         try:
             # For complex objects, you might want to serialize to JSON or pretty print
             if isinstance(value_to_email, (dict, list)):
-                 value_to_email_str = json.dumps(value_to_email, indent=2, ensure_ascii=False)
+                 value_to_email_str = _dumps(value_to_email)
             else:
                 value_to_email_str = str(value_to_email)
         except Exception as e:
@@ -69,48 +339,26 @@ def email_memorized_value(key: str, email_addresses: List[str], tool_context: To
         return {"status": "Error: Invalid email addresses provided. Must be a non-empty list of strings."}
 
     # --- Email Sending Logic ---
-    # IMPORTANT: Replace with your actual email credentials and server details
-    # It's highly recommended to use environment variables or a secrets manager for credentials.
-    sender_email = os.environ.get("SENDER_EMAIL", "kshitija369@gmail.com")
-    sender_password = os.environ.get("SENDER_APP_PASSWORD", "nueg zvcv qsyi mzlb") # Use an App Password
-    smtp_server = os.environ.get("SMTP_SERVER", "smtp.gmail.com")
-    smtp_port = int(os.environ.get("SMTP_PORT", 587))
-
-
     subject = f"Memorized Information: {key}"
     body = f"Hello,\n\nThe memorized value for '{key}' is:\n\n{value_to_email_str}\n\nRegards,\nAI Agent"
 
-    # Create the email message with UTF-8 encoding for the body
-    msg = MIMEText(body, 'plain', 'utf-8')
-    msg['Subject'] = subject
-    msg['From'] = sender_email
-    msg['To'] = ", ".join(email_addresses) # Comma-separated list for the 'To' header
-
+    # Hand the message to the background batcher so repeated memorize -> email
+    # cycles in one agent session share a single SMTP connection instead of
+    # paying the TLS + AUTH handshake per message.
     try:
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.ehlo() # Identify ourselves to the ESMTP server.
-            server.starttls()  # Enable security
-            server.ehlo() # Re-identify ourselves as an ESMTP client after STARTTLS.
-            server.login(sender_email, sender_password)
-            # sendmail's second argument (rcpttos) should be a list of recipient addresses
-            server.sendmail(sender_email, email_addresses, msg.as_string())
-        return {"status": f'Successfully emailed "{key}" to {", ".join(email_addresses)}.'}
-    except smtplib.SMTPAuthenticationError:
-        return {"status": "Error: Email authentication failed. Check your email/password or App Password setup."}
-    except smtplib.SMTPServerDisconnected:
-        return {"status": "Error: Could not connect to the SMTP server. Server might be down or incorrect."}
-    except smtplib.SMTPRecipientsRefused as e:
-        # e.recipients will be a dictionary of addresses that were refused
-        refused_str = ", ".join([f"{addr}: {err}" for addr, err in e.recipients.items()])
-        return {"status": f"Error: Some recipient email addresses were refused by the server: {refused_str}"}
-    except smtplib.SMTPDataError as e:
-        return {"status": f"Error: The SMTP server didn't accept the message data (code: {e.smtp_code}): {e.smtp_error}"}
+        _EMAIL_BATCHER.enqueue(subject, body, email_addresses)
+        return {"status": f'Queued email of "{key}" to {", ".join(email_addresses)}.'}
     except Exception as e:
-        return {"status": f'An unexpected error occurred while sending email: {e}'}
+        return {"status": f'An unexpected error occurred while queueing email: {e}'}
     # --- End Email Sending Logic ---
 
 
 
+def _seen_key(key: str) -> str:
+    """Companion state key holding a dict used for O(1) membership checks."""
+    return f"__seen__{key}"
+
+
 def memorize_list(key: str, value: str, tool_context: ToolContext):
     """
     Memorize pieces of information.
@@ -124,10 +372,20 @@ def memorize_list(key: str, value: str, tool_context: ToolContext):
         A status message.
     """
     mem_dict = tool_context.state
-    if key not in mem_dict:
-        mem_dict[key] = []
-    if value not in mem_dict[key]:
-        mem_dict[key].append(value)
+    # The stored value stays a plain list (ADK state is JSON-backed), but
+    # membership is tracked in a companion dict so repeated memorization is
+    # O(1) per value instead of an O(n) list scan.
+    seen = mem_dict.get(_seen_key(key))
+    if not seen:
+        # Seed from any list entries that predate the companion dict (values
+        # preloaded by the scenario, or a list stored after the companion was
+        # dropped); reseeding an empty companion is harmless and keeps its
+        # keys a subset of the list contents.
+        seen = {item: 1 for item in mem_dict.get(key, [])}
+        mem_dict[_seen_key(key)] = seen
+    if value not in seen:
+        seen[value] = 1
+        mem_dict.setdefault(key, []).append(value)
     return {"status": f'Stored "{key}": "{value}"'}
 
 
@@ -144,6 +402,11 @@ def memorize(key: str, value: str, tool_context: ToolContext):
         A status message.
     """
     mem_dict = tool_context.state
+    # Overwriting the key invalidates any companion membership dict that
+    # memorize_list maintained for it; drop the stale entries so a later
+    # memorize_list reseeds from whatever is actually stored.
+    if mem_dict.get(_seen_key(key)):
+        mem_dict[_seen_key(key)] = {}
     mem_dict[key] = value
     return {"status": f'Stored "{key}": "{value}"'}
 
@@ -162,10 +425,28 @@ def forget(key: str, value: str, tool_context: ToolContext):
     Returns:
         A status message.
     """
-    if tool_context.state[key] is None:
+    # The old implementation raised KeyError for unknown keys and only reset
+    # the list when the stored value was literally None; treat any non-list as
+    # "nothing to forget" instead.
+    memories = tool_context.state.get(key)
+    if not isinstance(memories, list):
         tool_context.state[key] = []
-    if value in tool_context.state[key]:
-        tool_context.state[key].remove(value)
+        # Keep the companion membership dict in step with the now-empty list;
+        # a stale entry would shadow future appends and removals.
+        if tool_context.state.get(_seen_key(key)):
+            tool_context.state[_seen_key(key)] = {}
+        return {"status": f'Removed "{key}": "{value}"'}
+    # Consult the companion dict maintained by memorize_list for an O(1)
+    # membership check before paying for the O(n) list removal. It is only
+    # an optimization hint: the removal itself is still guarded against the
+    # list, so a stale companion entry can never raise ValueError.
+    seen = tool_context.state.get(_seen_key(key))
+    if seen is not None:
+        if value not in seen:
+            return {"status": f'Removed "{key}": "{value}"'}
+        seen.pop(value)
+    if value in memories:
+        memories.remove(value)
     return {"status": f'Removed "{key}": "{value}"'}
 
 
@@ -200,10 +481,6 @@ def _load_precreated_itinerary(callback_context: CallbackContext):
 
     Args:
         callback_context: The callback context.
-    """    
-    data = {}
-    with open(SAMPLE_SCENARIO_PATH, "r") as file:
-        data = json.load(file)
-        print(f"\nLoading Initial State: {data}\n")
-
+    """
+    data = _fresh_scenario()
     _set_initial_states(data["state"], callback_context.state)
@@ -1,20 +1,32 @@
 # db.py
 from google.cloud import firestore
-from typing import Dict, Any, Optional, List, Union
+from typing import Annotated, Dict, Any, Literal, Optional, List, Tuple, Union
+import asyncio
+import concurrent.futures
+import functools
+import threading
+import time
 import uuid
 import os
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
 import logging
-import traceback
+
+logger = logging.getLogger(__name__)
 
 # --- Pydantic Models ---
+# Shared config: ignore unknown fields coming back from Firestore instead of
+# erroring, and accept population by field name as well as alias.
+_MODEL_CONFIG = ConfigDict(extra='ignore', populate_by_name=True)
+
 class AirportEvent(BaseModel):
+  model_config = _MODEL_CONFIG
   city_name: str = Field(description="Name of the departure city")
   airport_code: str = Field(description="IATA code of the departure airport")
   timestamp: str = Field(description="ISO 8601 departure or arrival date and time")
 
 class AttractionEvent(BaseModel):
-  event_type: str = Field(default="visit")
+  model_config = _MODEL_CONFIG
+  event_type: Literal["visit"] = Field(default="visit")
   description: str = Field(description="A title or description of the activity or the attraction visit")
   address: str = Field(description="Full address of the attraction")
   start_time: str = Field(description="Time in HH:MM format, e.g. 16:00")
@@ -23,7 +35,8 @@ class AttractionEvent(BaseModel):
   price: Optional[str] = Field(default=None, description="Some events may cost money")
 
 class FlightEvent(BaseModel):
-  event_type: str = Field(default="flight")
+  model_config = _MODEL_CONFIG
+  event_type: Literal["flight"] = Field(default="flight")
   description: str = Field(description="A title or description of the Flight")
   booking_required: bool = Field(default=True)
   departure_airport: str = Field(description="Airport code, i.e. SEA")
@@ -37,7 +50,8 @@ class FlightEvent(BaseModel):
   booking_id: Optional[str] = Field(default=None, description="Booking Reference ID, e.g LMN-012-STU")
 
 class HotelEvent(BaseModel):
-  event_type: str = Field(default="hotel")
+  model_config = _MODEL_CONFIG
+  event_type: Literal["hotel"] = Field(default="hotel")
   description: str = Field(description="A name, title or a description of the hotel")
   address: str = Field(description="Full address of the attraction")
   check_in_time: str = Field(description="Time in HH:MM format, e.g. 16:00")
@@ -47,12 +61,18 @@ class HotelEvent(BaseModel):
   price: Optional[str] = Field(default=None, description="Total hotel price including all nights")
   booking_id: Optional[str] = Field(default=None, description="Booking Reference ID, e.g ABCD12345678")
 
+# Discriminated union: the event_type tag picks the event class directly
+# instead of Pydantic trying each member in turn per event.
+TripEvent = Annotated[Union[FlightEvent, HotelEvent, AttractionEvent], Field(discriminator='event_type')]
+
 class ItineraryDay(BaseModel):
+  model_config = _MODEL_CONFIG
   day_number: int = Field(description="Identify which day of the trip this represents, e.g. 1, 2, 3... etc.")
   date: str = Field(description="The Date this day YYYY-MM-DD format")
-  events: List[Union[FlightEvent, HotelEvent, AttractionEvent]] = Field(default=[], description="The list of events for the day")
+  events: List[TripEvent] = Field(default_factory=list, description="The list of events for the day")
 
 class Itinerary(BaseModel):
+  model_config = _MODEL_CONFIG
   trip_name: str = Field(default="Untitled Trip", description="Simple one liner to describe the trip. e.g. 'San Diego to Seattle Getaway'")
   start_date: str = Field(description="Trip Start Date in YYYY-MM-DD format")
   end_date: str = Field(description="Trip End Date in YYYY-MM-DD format")
@@ -61,6 +81,7 @@ class Itinerary(BaseModel):
   days: List[ItineraryDay] = Field(default_factory=list, description="The multi-days itinerary")
 
 class StoredTripDocument(BaseModel):
+  model_config = _MODEL_CONFIG
   trip_id: str
   user_id: str
   trip_name: str
@@ -71,131 +92,440 @@ class StoredTripDocument(BaseModel):
   status: str = "upcoming"
 # --- End Pydantic Models ---
 
+# Detect the Pydantic major version once at import instead of catching
+# AttributeError on every save/load: the answer never changes at runtime.
+_HAS_PYDANTIC_V2 = hasattr(StoredTripDocument, "model_dump")
+if _HAS_PYDANTIC_V2:
+  def _dump(model: BaseModel) -> Dict[str, Any]:
+    return model.model_dump(exclude_none=True)
+  _validate_itinerary = Itinerary.model_validate
+else: # Pydantic V1
+  def _dump(model: BaseModel) -> Dict[str, Any]:
+    return model.dict(exclude_none=True)
+  def _validate_itinerary(data: Dict[str, Any]) -> Itinerary:
+    return Itinerary(**data)
+
+try:
+  # Canonical (sorted-keys) serialization doubles as the cache key below;
+  # orjson when installed, stdlib json otherwise, same as elsewhere.
+  import orjson
+  def _itinerary_cache_key(data: Dict[str, Any]) -> bytes:
+    return orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+  _itinerary_cache_loads = orjson.loads
+except ImportError:
+  import json
+  def _itinerary_cache_key(data: Dict[str, Any]) -> bytes:
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+  _itinerary_cache_loads = json.loads
+
+@functools.lru_cache(maxsize=1024)
+def _validate_itinerary_from_key(key: bytes) -> Itinerary:
+  return _validate_itinerary(_itinerary_cache_loads(key))
+
+def validate_itinerary_cached(data: Dict[str, Any]) -> Itinerary:
+  """Validates an itinerary dict, memoizing by its canonical serialization.
+
+  The same trip document gets fetched and re-validated over and over while a
+  user browses; hashing the sorted-keys JSON lets identical payloads skip the
+  whole Pydantic walk. The returned model is shared between callers, so treat
+  it as read-only. Falls through to direct validation for payloads that
+  can't be serialized.
+  """
+  try:
+    key = _itinerary_cache_key(data)
+  except TypeError:
+    return _validate_itinerary(data)
+  return _validate_itinerary_from_key(key)
+
+# The Itinerary tree is deeply nested and validation-heavy, so it matters
+# that the deployed environment runs the compiled pydantic core (Rust
+# pydantic-core on V2, the Cython-compiled wheel on V1) rather than a
+# pure-Python fallback. Warn by default; set REQUIRE_COMPILED_PYDANTIC=1
+# in CI/deploy images to fail loudly instead.
+def _pydantic_is_compiled() -> bool:
+  try:
+    if _HAS_PYDANTIC_V2:
+      from pydantic_core import _pydantic_core
+      return not str(getattr(_pydantic_core, "__file__", "")).endswith(".py")
+    import pydantic
+    return bool(getattr(pydantic, "compiled", False))
+  except Exception:
+    return False
+
+if not _pydantic_is_compiled():
+  if os.getenv("REQUIRE_COMPILED_PYDANTIC"):
+    raise ImportError("Compiled pydantic core required but not found; install the binary pydantic wheel.")
+  logger.warning("Pydantic is running without its compiled core; itinerary validation will be slow.")
+
 FIRESTORE_CLIENT: Optional[firestore.Client] = None
+_client_lock = threading.Lock()
 # Ensure this collection name is what you want in Firestore
 TRIPS_COLLECTION = "user_trips_v2" # Changed to v2 for clarity if you had v1
 
-def initialize_firestore_client(project_id: Optional[str] = None, database_id: str = "ai-agent-dev") -> bool:
+def get_client() -> Optional[firestore.Client]:
+  """Returns the shared Firestore client, creating it on first use.
+
+  Thread-safe double-checked initialization: the common case is a single
+  unlocked read of the module global; only the very first callers contend on
+  the lock, so concurrent request handlers never race to build duplicate
+  clients (each of which would open its own gRPC channel).
+  """
   global FIRESTORE_CLIENT
-  if FIRESTORE_CLIENT is None:
-    try:
-      effective_project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
-      database_id = os.getenv("GOOGLE_FIRESTORE_DB")
-      if not effective_project_id:
-        logging.error("ERROR (db.py): GOOGLE_CLOUD_PROJECT not set for Firestore.")
-        return False
+  client = FIRESTORE_CLIENT
+  if client is not None:
+    return client
+  with _client_lock:
+    if FIRESTORE_CLIENT is None:
+      try:
+        effective_project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        database_id = os.getenv("GOOGLE_FIRESTORE_DB")
+        if not effective_project_id:
+          logger.error("GOOGLE_CLOUD_PROJECT not set for Firestore.")
+          return None
 
-      FIRESTORE_CLIENT = firestore.Client(project=effective_project_id, database=database_id)
+        FIRESTORE_CLIENT = firestore.Client(project=effective_project_id, database=database_id)
 
-      print(f"INFO (db.py): Firestore client initialized for project '{effective_project_id}' and database '{database_id}'.")
-      return True
-    except Exception as e:
-      logging.error(f"ERROR (db.py): Failed to initialize Firestore client: {e}")
-      traceback.print_exc()
-      FIRESTORE_CLIENT = None
-      return False
-  return True
+        print(f"INFO (db.py): Firestore client initialized for project '{effective_project_id}' and database '{database_id}'.")
+      except Exception:
+        logger.exception("Failed to initialize Firestore client.")
+        FIRESTORE_CLIENT = None
+        return None
+  return FIRESTORE_CLIENT
 
-# In db.py
+def initialize_firestore_client(project_id: Optional[str] = None, database_id: str = "ai-agent-dev") -> bool:
+  return get_client() is not None
 
-# In db.py
+ASYNC_FIRESTORE_CLIENT: Optional[firestore.AsyncClient] = None
+
+def get_async_client() -> Optional[firestore.AsyncClient]:
+  """Returns the shared async Firestore client, creating it on first use.
+
+  Same double-checked initialization as get_client(); the async client rides
+  the async gRPC transport so callers can keep many reads in flight at once.
+  """
+  global ASYNC_FIRESTORE_CLIENT
+  client = ASYNC_FIRESTORE_CLIENT
+  if client is not None:
+    return client
+  with _client_lock:
+    if ASYNC_FIRESTORE_CLIENT is None:
+      try:
+        effective_project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
+        database_id = os.getenv("GOOGLE_FIRESTORE_DB")
+        if not effective_project_id:
+          logger.error("GOOGLE_CLOUD_PROJECT not set for Firestore.")
+          return None
+        ASYNC_FIRESTORE_CLIENT = firestore.AsyncClient(project=effective_project_id, database=database_id)
+      except Exception:
+        logger.exception("Failed to initialize async Firestore client.")
+        ASYNC_FIRESTORE_CLIENT = None
+        return None
+  return ASYNC_FIRESTORE_CLIENT
+
+# Firestore caps a single WriteBatch at 500 operations.
+_FIRESTORE_BATCH_LIMIT = 500
+
+def _trip_doc_data(user_id: str, itinerary: Itinerary, trip_id: str) -> Dict[str, Any]:
+  """Builds the Firestore document dict for one trip."""
+  # Create the main Pydantic model, but we'll handle created_at separately for Firestore
+  trip_data_for_pydantic = StoredTripDocument(
+      trip_id=trip_id,
+      user_id=user_id,
+      trip_name=itinerary.trip_name or "Untitled Trip",
+      start_date=itinerary.start_date,
+      end_date=itinerary.end_date,
+      itinerary_details=itinerary,
+      created_at=None, # Placeholder, will be replaced by Firestore Sentinel
+      status="upcoming"
+  )
+
+  # Convert Pydantic model to a dictionary first.
+  # mode='json' would serialize too much (e.g. datetimes to strings before
+  # Firestore can handle them), so dump to plain Python types and then
+  # replace the timestamp sentinel below.
+  data_to_set: Dict[str, Any] = _dump(trip_data_for_pydantic)
+
+  # Now, explicitly set the Firestore server timestamp sentinel in the dictionary
+  data_to_set['created_at'] = firestore.SERVER_TIMESTAMP
+  return data_to_set
 
 def save_trip_to_firestore(user_id: str, itinerary: Itinerary) -> Optional[str]:
-  if not FIRESTORE_CLIENT and not initialize_firestore_client(): # Ensure client is initialized
-    logging.error("ERROR (db.py): Firestore client not available in save_trip_to_firestore.")
+  client = get_client()
+  if client is None:
+    logger.error("Firestore client not available in save_trip_to_firestore.")
     return None
 
   try:
-    trip_id = str(uuid.uuid4())
-    doc_ref = FIRESTORE_CLIENT.collection(TRIPS_COLLECTION).document(trip_id)
-
-    # Create the main Pydantic model, but we'll handle created_at separately for Firestore
-    trip_data_for_pydantic = StoredTripDocument(
-        trip_id=trip_id,
-        user_id=user_id,
-        trip_name=itinerary.trip_name or "Untitled Trip",
-        start_date=itinerary.start_date,
-        end_date=itinerary.end_date,
-        itinerary_details=itinerary,
-        created_at=None, # Placeholder, will be replaced by Firestore Sentinel
-        status="upcoming"
-    )
-
-    # Convert Pydantic model to a dictionary first
-    data_to_set: Dict[str, Any]
-    try:
-      # Pydantic V2: mode='python' gets basic Python types where possible,
-      # but we need to ensure nested Pydantic models are also dicts.
-      # mode='json' would serialize too much (e.g. datetimes to strings before Firestore can handle them).
-      # Safest is to dump to dict, then replace.
-      data_to_set = trip_data_for_pydantic.model_dump(exclude_none=True)
-    except AttributeError: # Fallback for Pydantic V1
-      data_to_set = trip_data_for_pydantic.dict(exclude_none=True)
-
-    # Now, explicitly set the Firestore server timestamp sentinel in the dictionary
-    data_to_set['created_at'] = firestore.SERVER_TIMESTAMP
-
-    doc_ref.set(data_to_set) # Pass the dictionary with the Sentinel directly to Firestore
-
-    logging.info(f"INFO (db.py): Trip saved to Firestore with ID: {trip_id} for user: {user_id}")
+    # .hex keeps the full 122 bits of entropy in 32 chars (no dashes), so
+    # document IDs and their composite-index entries stay smaller.
+    trip_id = uuid.uuid4().hex
+    doc_ref = client.collection(TRIPS_COLLECTION).document(trip_id)
+    doc_ref.set(_trip_doc_data(user_id, itinerary, trip_id))
+
+    logger.info("Trip saved to Firestore with ID: %s for user: %s", trip_id, user_id)
     return trip_id
-  except Exception as e:
-    logging.error(f"ERROR (db.py): Failed to save trip to Firestore for user {user_id}: {e}")
-    traceback.print_exc()
+  except Exception:
+    logger.exception("Failed to save trip to Firestore for user %s", user_id)
     return None
 
-def get_trips_for_user_from_firestore(user_id: str, status: Optional[str] = "upcoming") -> List[Dict[str, Any]]:
-  if not FIRESTORE_CLIENT and not initialize_firestore_client():
-    logging.error("ERROR (db.py): Firestore client not available in get_trips_for_user.")
+def save_trips_to_firestore(user_id: str, itineraries: List[Itinerary]) -> List[str]:
+  """Saves several trips in one round-trip per 500 writes via WriteBatch.
+
+  Persisting a finalized plan often writes a trip plus related documents in
+  sequence; batching amortizes N network round-trips into one commit per
+  chunk. Returns the new trip IDs, or [] if any commit fails.
+  """
+  client = get_client()
+  if client is None:
+    logger.error("Firestore client not available in save_trips_to_firestore.")
     return []
 
   try:
-    query = FIRESTORE_CLIENT.collection(TRIPS_COLLECTION).where("user_id", "==", user_id)
-    if status:
-      query = query.where("status", "==", status)
-    # Ensure the composite index for this query exists in Firestore:
-    # user_id (ASC), status (ASC), start_date (ASC)
-    query = query.order_by("start_date", direction=firestore.Query.ASCENDING)
-
-    trips_summary = []
-    for doc_snapshot in query.stream():
-      trip_data = doc_snapshot.to_dict()
-      trips_summary.append({
-          "trip_id": trip_data.get("trip_id"),
-          "trip_name": trip_data.get("trip_name", "Untitled Trip"), # Add default
-          "start_date": trip_data.get("start_date"),
-          "end_date": trip_data.get("end_date"),
-          "status": trip_data.get("status")
-      })
-    logging.info(f"INFO (db.py): Retrieved {len(trips_summary)} trips for user: {user_id} status: {status}")
+    trip_ids: List[str] = []
+    collection = client.collection(TRIPS_COLLECTION)
+    for chunk_start in range(0, len(itineraries), _FIRESTORE_BATCH_LIMIT):
+      batch = client.batch()
+      for itinerary in itineraries[chunk_start:chunk_start + _FIRESTORE_BATCH_LIMIT]:
+        trip_id = uuid.uuid4().hex
+        batch.set(collection.document(trip_id), _trip_doc_data(user_id, itinerary, trip_id))
+        trip_ids.append(trip_id)
+      batch.commit()
+    logger.info("Saved %d trips to Firestore for user: %s", len(trip_ids), user_id)
+    return trip_ids
+  except Exception:
+    logger.exception("Failed to batch-save trips to Firestore for user %s", user_id)
+    return []
+
+class TripWriteBatcher:
+  """Coalesces concurrent single-trip saves into shared WriteBatch commits.
+
+  Endpoint handlers call submit() and await their trip ID; behind the scenes
+  a drain task collects whatever requests arrive within a short window (or
+  until the batch fills) and commits them together on a worker thread, so N
+  concurrent saves cost one Firestore round-trip instead of N. Each commit
+  runs on its own pool thread, so slow commits overlap rather than queue.
+  """
+
+  # Small window: just long enough to coalesce a burst of concurrent saves
+  # without adding noticeable latency to a lone request.
+  _MAX_BATCH = 40
+  _MAX_WAIT_SECS = 0.02
+
+  def __init__(self, max_workers: int = 10):
+    self._queue: Optional[asyncio.Queue] = None
+    self._executor = concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="trip-writer")
+    self._drain_task: Optional[asyncio.Task] = None
+
+  def start(self) -> None:
+    """Starts the drain task; must be called from a running event loop."""
+    if self._drain_task is None:
+      self._queue = asyncio.Queue()
+      self._drain_task = asyncio.get_running_loop().create_task(self._drain())
+
+  async def submit(self, user_id: str, itinerary: Itinerary) -> Optional[str]:
+    """Queues one trip save; resolves to its trip ID once the batch commits."""
+    if self._queue is None:
+      # Batcher not started (e.g. called outside the server); write directly.
+      return await asyncio.to_thread(save_trip_to_firestore, user_id, itinerary)
+    future: asyncio.Future = asyncio.get_running_loop().create_future()
+    await self._queue.put((user_id, itinerary, future))
+    return await future
+
+  async def _drain(self) -> None:
+    assert self._queue is not None
+    loop = asyncio.get_running_loop()
+    while True:
+      pending = [await self._queue.get()]
+      deadline = loop.time() + self._MAX_WAIT_SECS
+      while len(pending) < self._MAX_BATCH:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+          break
+        try:
+          pending.append(await asyncio.wait_for(self._queue.get(), timeout))
+        except asyncio.TimeoutError:
+          break
+      loop.run_in_executor(
+          self._executor, self._commit_batch, pending, loop)
+
+  def _commit_batch(self, pending: List[Tuple[str, Itinerary, asyncio.Future]],
+                    loop: asyncio.AbstractEventLoop) -> None:
+    """Commits one coalesced batch on a pool thread and resolves the futures."""
+    trip_ids: List[Optional[str]] = [None] * len(pending)
+    client = get_client()
+    if client is not None:
+      try:
+        collection = client.collection(TRIPS_COLLECTION)
+        batch = client.batch()
+        for i, (user_id, itinerary, _) in enumerate(pending):
+          trip_id = uuid.uuid4().hex
+          batch.set(collection.document(trip_id), _trip_doc_data(user_id, itinerary, trip_id))
+          trip_ids[i] = trip_id
+        batch.commit()
+        logger.info("Committed batch of %d trip saves.", len(pending))
+      except Exception:
+        logger.exception("Failed to commit batch of %d trip saves.", len(pending))
+        trip_ids = [None] * len(pending)
+    else:
+      logger.error("Firestore client not available in TripWriteBatcher.")
+    for (_, _, future), trip_id in zip(pending, trip_ids):
+      loop.call_soon_threadsafe(_resolve_future, future, trip_id)
+
+def _resolve_future(future: asyncio.Future, trip_id: Optional[str]) -> None:
+  if not future.done():
+    future.set_result(trip_id)
+
+# Process-wide batcher; main.py starts it from the FastAPI startup event.
+trip_write_batcher = TripWriteBatcher()
+
+# Fields returned by trip list queries; everything else (notably the nested
+# itinerary_details blob) stays server-side.
+TRIP_SUMMARY_FIELDS = ["trip_id", "trip_name", "start_date", "end_date", "status"]
+
+def _build_trips_query(client, user_id: str, status: Optional[str],
+                       limit: int, start_after: Optional[str]):
+  """Builds the summary-projected trips query; works for sync and async clients."""
+  query = client.collection(TRIPS_COLLECTION).where("user_id", "==", user_id)
+  if status:
+    query = query.where("status", "==", status)
+  # Ensure the composite index for this query exists in Firestore:
+  # user_id (ASC), status (ASC), start_date (ASC)
+  query = query.order_by("start_date", direction=firestore.Query.ASCENDING)
+  # Project to the summary fields so Firestore doesn't ship the full
+  # itinerary_details blob over the wire just to be discarded here.
+  query = query.select(TRIP_SUMMARY_FIELDS)
+  if start_after:
+    query = query.start_after({"start_date": start_after})
+  return query.limit(limit)
+
+def _summarize_trip(trip_data: Dict[str, Any]) -> Dict[str, Any]:
+  summary = {field: trip_data.get(field) for field in TRIP_SUMMARY_FIELDS}
+  summary["trip_name"] = summary["trip_name"] or "Untitled Trip" # Add default
+  return summary
+
+def get_trips_for_user_from_firestore(user_id: str, status: Optional[str] = "upcoming",
+                                      limit: int = 50, start_after: Optional[str] = None) -> List[Dict[str, Any]]:
+  client = get_client()
+  if client is None:
+    logger.error("Firestore client not available in get_trips_for_user.")
+    return []
+
+  try:
+    query = _build_trips_query(client, user_id, status, limit, start_after)
+    trips_summary = [_summarize_trip(doc_snapshot.to_dict()) for doc_snapshot in query.stream()]
+    logger.info("Retrieved %d trips for user: %s status: %s", len(trips_summary), user_id, status)
+    return trips_summary
+  except Exception:
+    logger.exception("Failed to get trips from Firestore for user %s", user_id)
+    return []
+
+async def get_trips_for_user_from_firestore_async(user_id: str, status: Optional[str] = "upcoming",
+                                                  limit: int = 50, start_after: Optional[str] = None) -> List[Dict[str, Any]]:
+  """Async variant of get_trips_for_user_from_firestore for concurrent callers."""
+  client = get_async_client()
+  if client is None:
+    logger.error("Async Firestore client not available in get_trips_for_user_async.")
+    return []
+
+  try:
+    query = _build_trips_query(client, user_id, status, limit, start_after)
+    trips_summary = [_summarize_trip(doc_snapshot.to_dict()) async for doc_snapshot in query.stream()]
+    logger.info("Retrieved %d trips for user: %s status: %s", len(trips_summary), user_id, status)
     return trips_summary
-  except Exception as e:
-    logging.error(f"ERROR (db.py): Failed to get trips from Firestore for user {user_id}: {e}")
-    traceback.print_exc()
+  except Exception:
+    logger.exception("Failed to get trips from Firestore for user %s", user_id)
     return []
 
+try:
+  from cachetools import TTLCache
+except ImportError:
+  class TTLCache(dict):
+    """Minimal stand-in for cachetools.TTLCache: per-entry expiry, FIFO cap."""
+    def __init__(self, maxsize: int, ttl: float):
+      super().__init__()
+      self._maxsize = maxsize
+      self._ttl = ttl
+    def get(self, key, default=None):
+      entry = dict.get(self, key)
+      if entry is None:
+        return default
+      expires_at, value = entry
+      if time.monotonic() >= expires_at:
+        dict.pop(self, key, None)
+        return default
+      return value
+    def __setitem__(self, key, value):
+      if len(self) >= self._maxsize:
+        dict.pop(self, next(iter(self)), None)
+      dict.__setitem__(self, key, (time.monotonic() + self._ttl, value))
+
+# Short-TTL cache for the common "upcoming trips" dashboard page; keyed by
+# (user_id, status, limit, cursor) so every distinct page caches separately.
+_TRIPS_PAGE_CACHE = TTLCache(maxsize=4096, ttl=120)
+_trips_page_cache_lock = threading.Lock()
+
+def get_trips_page_for_user_from_firestore(user_id: str, status: Optional[str] = "upcoming",
+                                           limit: int = 50, start_after: Optional[str] = None) -> Dict[str, Any]:
+  """Keyset-paginated trip listing.
+
+  Returns {"trips": [...], "next_cursor": <start_date or None>}; pass the
+  cursor back as start_after to fetch the next page. Cursor paging keeps the
+  index scan bounded regardless of how deep the caller pages, unlike
+  OFFSET-style paging, and repeat requests within the TTL are served from
+  the in-process cache without touching Firestore.
+  """
+  cache_key = (user_id, status, limit, start_after)
+  with _trips_page_cache_lock:
+    cached = _TRIPS_PAGE_CACHE.get(cache_key)
+  if cached is not None:
+    return cached
+
+  trips = get_trips_for_user_from_firestore(user_id, status, limit, start_after)
+  next_cursor = trips[-1].get("start_date") if len(trips) == limit else None
+  page = {"trips": trips, "next_cursor": next_cursor}
+  with _trips_page_cache_lock:
+    _TRIPS_PAGE_CACHE[cache_key] = page
+  return page
+
+async def get_trips_for_users(user_ids: List[str], status: Optional[str] = "upcoming") -> Dict[str, List[Dict[str, Any]]]:
+  """Fetches trip summaries for many users with their reads in flight concurrently.
+
+  The work is network-bound, so gathering the per-user queries scales with the
+  number of users until the gRPC channel saturates, instead of paying one
+  round-trip after another.
+  """
+  results = await asyncio.gather(
+      *[get_trips_for_user_from_firestore_async(user_id, status) for user_id in user_ids]
+  )
+  return dict(zip(user_ids, results))
+
 def get_trip_details_from_firestore(trip_id: str) -> Optional[Itinerary]:
-  if not FIRESTORE_CLIENT and not initialize_firestore_client():
-    logging.error("ERROR (db.py): Firestore client not available in get_trip_details.")
+  client = get_client()
+  if client is None:
+    logger.error("Firestore client not available in get_trip_details.")
     return None
 
   try:
-    doc_ref = FIRESTORE_CLIENT.collection(TRIPS_COLLECTION).document(trip_id)
+    doc_ref = client.collection(TRIPS_COLLECTION).document(trip_id)
     doc_snapshot = doc_ref.get()
     if doc_snapshot.exists:
       trip_data_dict = doc_snapshot.to_dict()
       itinerary_details_dict = trip_data_dict.get("itinerary_details")
       if itinerary_details_dict:
-        try: # Pydantic V2
-          return Itinerary.model_validate(itinerary_details_dict)
-        except AttributeError: # Pydantic V1
-          return Itinerary(**itinerary_details_dict)
-      logging.warning(f"WARNING (db.py): Itinerary details missing for trip ID {trip_id}.")
+        return validate_itinerary_cached(itinerary_details_dict)
+      logger.warning("Itinerary details missing for trip ID %s.", trip_id)
       return None
     else:
-      logging.warning(f"WARNING (db.py): Trip with ID {trip_id} not found in Firestore.")
+      logger.warning("Trip with ID %s not found in Firestore.", trip_id)
       return None
-  except Exception as e:
-    logging.error(f"ERROR (db.py): Failed to get trip details from Firestore for ID {trip_id}: {e}")
-    traceback.print_exc()
-    return None
\ No newline at end of file
+  except Exception:
+    logger.exception("Failed to get trip details from Firestore for ID %s", trip_id)
+    return None
+
+# Warm the shared client at import so the first request doesn't pay gRPC
+# channel setup; tolerate missing env so tests can still import this module.
+try:
+  get_client()
+except Exception:
+  pass
\ No newline at end of file
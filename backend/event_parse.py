@@ -0,0 +1,67 @@
+# event_parse.py
+"""Hot event-parsing helpers for the agent stream.
+
+This module is deliberately plain, fully-annotated Python over dicts so it
+can be AOT-compiled (e.g. with mypyc, which compiles match statements to
+direct dict probes) without source changes; vertex_ai_client.py imports it
+transparently either way. Requires Python >= 3.10 for structural pattern
+matching.
+"""
+
+from typing import Any, Dict, Optional
+import logging
+import sys
+
+log = logging.getLogger(__name__)
+
+# Wrapper keys probed in the fallback stage; interning them makes the dict
+# probes pointer comparisons against the (equally interned) keys the JSON
+# decoder produced. The mapping-pattern keys below are code-object constants
+# and get the same treatment from the compiler.
+_WRAPPER_KEYS = tuple(sys.intern(k) for k in
+                      ('tool_output', 'tool_result', 'structured_output', 'output'))
+
+
+def extract_itinerary(event: Any) -> Optional[Dict[str, Any]]:
+    """Returns the non-empty itinerary dict carried by one stream event, or None.
+
+    Checks the shapes ADK is known to use, most reliable first, and returns
+    on the first hit. Each stage is a match over the expected nesting, so
+    the shape test and the extraction happen in one pass: it runs for every
+    streamed event.
+    """
+    if type(event) is not dict:
+        return None
+
+    # 1. state_delta (often the most reliable for output_key).
+    match event:
+        case {'actions': {'state_delta': {'itinerary': dict() as itinerary}}} if itinerary:
+            log.debug("Found itinerary in event['actions']['state_delta'].")
+            return itinerary
+
+    # 2. function_response / tool_code_execution_result parts (tool output).
+    match event:
+        case {'content': {'parts': list() as parts}}:
+            for part in parts:
+                match part:
+                    # Assuming the direct response is the itinerary object
+                    case {'function_response': {'name': 'itinerary_agent',
+                                                'response': dict() as response}} if response:
+                        log.debug("Found itinerary in function_response for itinerary_agent.")
+                        return response
+                    # Kept just in case, though function_response is what ADK uses here.
+                    case {'tool_code_execution_result': {'itinerary': dict() as itinerary}} if itinerary:
+                        log.debug("Found itinerary nested in tool_code_execution_result.")
+                        return itinerary
+
+    # 3. Top-level or wrapped fallback keys.
+    match event:
+        case {'itinerary': dict() as itinerary} if itinerary:
+            log.debug("Found itinerary directly in event root.")
+            return itinerary
+    for key_to_check in _WRAPPER_KEYS:
+        match event.get(key_to_check):
+            case {'itinerary': dict() as itinerary} if itinerary:
+                log.debug("Found itinerary in event[%r].", key_to_check)
+                return itinerary
+    return None
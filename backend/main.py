@@ -1,12 +1,36 @@
 """Main module for the FastAPI application."""
 
 from typing import Any, Dict, List, Optional
+import asyncio
+import concurrent.futures
+import threading
+import os
 import uuid
 import logging
 
+log = logging.getLogger(__name__)
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, ValidationError
 
+try:
+  import orjson
+  def _sse_dumps(obj: Any) -> str:
+    return orjson.dumps(obj).decode()
+except ImportError:
+  orjson = None
+  import json
+  def _sse_dumps(obj: Any) -> str:
+    return json.dumps(obj)
+
+# Serialize responses with orjson when it's installed; the nested Itinerary
+# payloads are where stdlib json.dumps costs the most. ORJSONResponse is
+# importable even without orjson (it only asserts at render time), so branch
+# on the orjson import above rather than a never-failing ImportError.
+from fastapi.responses import JSONResponse, ORJSONResponse
+DefaultResponseClass = ORJSONResponse if orjson is not None else JSONResponse
+
 try:
   # Use relative imports if these files are in the same 'app' package
   from . import vertex_ai_client
@@ -58,89 +82,150 @@ class TripSummary(BaseModel):
   end_date: Optional[str] = None
   status: Optional[str] = None
 
-app = FastAPI()
+# When true, itineraries coming from our own agent skip full Pydantic
+# validation via model_construct; flip to False to re-validate while
+# debugging malformed agent output.
+TRUSTED_ITINERARY = True
+
+app = FastAPI(default_response_class=DefaultResponseClass)
 _fastapi_agent_service_initialized = False
 _firestore_client_initialized = False
-_sdk_session_id_cache: Dict[str, str] = {} # In-memory cache for SDK session IDs
+# In-memory cache for SDK session IDs. Bounded with a TTL: one entry per
+# unique web user would otherwise grow without limit on a long-running
+# server. db.TTLCache is cachetools.TTLCache when installed, else a minimal
+# fallback; accesses are guarded by a lock since requests run concurrently.
+if db_available:
+  _sdk_session_id_cache = db.TTLCache(maxsize=10_000, ttl=3600)
+else:
+  _sdk_session_id_cache = {}
+_sdk_session_cache_lock = threading.Lock()
+# Bounded pool installed as the event loop's default executor at startup.
+# Blocking agent streams dominate it (hence the name), but asyncio.to_thread
+# and run_in_executor(None, ...) callers share it too; sizing it explicitly
+# keeps long-lived streams from exhausting the stock default's thread count.
+_agent_stream_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=16, thread_name_prefix="agent-stream"
+)
 
-@app.on_event("startup")
-async def startup_event():
-  global _fastapi_agent_service_initialized, _firestore_client_initialized, _sdk_session_id_cache
-  _sdk_session_id_cache.clear()
-  print("INFO (main.py): FastAPI app starting up...")
-  if vertex_ai_client and initialize_globals_and_agent():
+async def _run_agent_init():
+  """Initializes the Vertex AI agent (blocking SDK calls on a worker thread)."""
+  global _fastapi_agent_service_initialized
+  ok = vertex_ai_client and await asyncio.to_thread(initialize_globals_and_agent)
+  if ok:
     _fastapi_agent_service_initialized = True
     print(f"INFO (main.py): Vertex AI Engine initialized status (from client module): {vertex_ai_client.IS_INITIALIZED}")
   else:
     _fastapi_agent_service_initialized = False
     logging.critical("CRITICAL (main.py): Vertex AI Agent Engine FAILED to initialize.")
 
-  if db_available and initialize_firestore_client(database_id="ai-agent-dev"): # Pass your DB ID
+async def _run_firestore_init():
+  """Initializes the Firestore client (blocking channel setup on a worker thread)."""
+  global _firestore_client_initialized
+  ok = db_available and await asyncio.to_thread(initialize_firestore_client, database_id="ai-agent-dev") # Pass your DB ID
+  if ok:
     _firestore_client_initialized = True
+    db.trip_write_batcher.start()
+    # Expose the shared client for anything that works from the app object
+    # (middleware, tests); db.get_client() returns this same instance.
+    app.state.firestore = db.get_client()
     print("INFO (main.py): Firestore client initialized successfully.")
   else:
     _firestore_client_initialized = False
     logging.critical("CRITICAL (main.py): Firestore client FAILED to initialize.")
 
-  print(f"INFO (main.py): FastAPI local _fastapi_agent_service_initialized: {_fastapi_agent_service_initialized}")
-  print(f"INFO (main.py): FastAPI local _firestore_client_initialized: {_firestore_client_initialized}")
-
-@app.post("/chat", response_model=AgentResponse)
-async def chat_with_agent_endpoint(user_input: UserInput):
-  global _fastapi_agent_service_initialized, _sdk_session_id_cache
-
-  if not _fastapi_agent_service_initialized:
-    raise HTTPException(status_code=503, detail="Agent service not available.")
-  if not (vertex_ai_client and vertex_ai_client.IS_INITIALIZED and vertex_ai_client.REMOTE_AGENT_ENGINE):
-    raise HTTPException(status_code=503, detail="Agent engine component missing.")
-
-  client_managed_session_id = user_input.session_id or str(uuid.uuid4())
-  stable_agent_user_id = f"web_user_{client_managed_session_id}"
-
-  print(f"FASTAPI DEBUG (main.py): UserInput: query='{user_input.query[:50]}...', client_managed_session_id='{client_managed_session_id}'")
-  print(f"FASTAPI DEBUG (main.py): Derived stable_agent_user_id: {stable_agent_user_id}")
+@app.on_event("startup")
+async def startup_event():
+  global _sdk_session_id_cache
+  _sdk_session_id_cache.clear()
+  loop = asyncio.get_running_loop()
+  loop.set_default_executor(_agent_stream_executor)
+  # Per-request diagnostics go through logging at DEBUG, so production runs
+  # skip the string formatting entirely; raise LOG_LEVEL=DEBUG to get them.
+  logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+  print("INFO (main.py): FastAPI app starting up...")
+  # Agent init (dominated by the warmup ping) and Firestore channel setup are
+  # independent network work, so run them concurrently instead of back to
+  # back; the server starts accepting connections immediately and /health
+  # reports readiness from these tasks.
+  app.state.startup_tasks = [
+      loop.create_task(_run_agent_init()),
+      loop.create_task(_run_firestore_init()),
+  ]
 
-  sdk_session_id_for_agent_query = _sdk_session_id_cache.get(stable_agent_user_id)
+def _resolve_sdk_session_id(client_managed_session_id: str, stable_agent_user_id: str) -> str:
+  """Returns the SDK session ID for this web user, creating and caching one if needed."""
+  with _sdk_session_cache_lock:
+    sdk_session_id_for_agent_query = _sdk_session_id_cache.get(stable_agent_user_id)
 
   if not sdk_session_id_for_agent_query:
-    print(f"FASTAPI DEBUG (main.py): No cached SDK session ID for {stable_agent_user_id}. Calling create_session.")
-    if hasattr(vertex_ai_client.REMOTE_AGENT_ENGINE, 'create_session'):
+    log.debug("No cached SDK session ID for %s. Calling create_session.", stable_agent_user_id)
+    if vertex_ai_client.CREATE_SESSION_FN is not None:
       try:
-        session_info = vertex_ai_client.REMOTE_AGENT_ENGINE.create_session(user_id=stable_agent_user_id)
+        session_info = vertex_ai_client.CREATE_SESSION_FN(user_id=stable_agent_user_id)
         returned_sdk_id = None
         if isinstance(session_info, dict): returned_sdk_id = session_info.get("id")
         elif hasattr(session_info, 'id'): returned_sdk_id = session_info.id
         if returned_sdk_id:
           sdk_session_id_for_agent_query = returned_sdk_id
-          _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
-          print(f"FASTAPI DEBUG (main.py): SDK create_session returned AND CACHED sdk_session_id: {sdk_session_id_for_agent_query} for {stable_agent_user_id}.")
+          with _sdk_session_cache_lock:
+            _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
+          log.debug("SDK create_session returned AND CACHED sdk_session_id: %s for %s.", sdk_session_id_for_agent_query, stable_agent_user_id)
         else:
           sdk_session_id_for_agent_query = client_managed_session_id
-          _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
-          print(f"FASTAPI WARN (main.py): SDK create_session no ID. Using and caching client_managed_id '{client_managed_session_id}'.")
+          with _sdk_session_cache_lock:
+            _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
+          log.warning("SDK create_session no ID. Using and caching client_managed_id %r.", client_managed_session_id)
       except Exception as cs_e:
         sdk_session_id_for_agent_query = client_managed_session_id
-        _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
-        print(f"FASTAPI WARN (main.py): Error SDK create_session for {stable_agent_user_id}: {cs_e}. Using and caching '{client_managed_session_id}'.")
+        with _sdk_session_cache_lock:
+          _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
+        log.warning("Error SDK create_session for %s: %s. Using and caching %r.", stable_agent_user_id, cs_e, client_managed_session_id)
     else:
       sdk_session_id_for_agent_query = client_managed_session_id
-      _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
-      print(f"FASTAPI DEBUG (main.py): No 'create_session'. Using and caching client_managed_id.")
+      with _sdk_session_cache_lock:
+        _sdk_session_id_cache[stable_agent_user_id] = sdk_session_id_for_agent_query
+      log.debug("No 'create_session'. Using and caching client_managed_id.")
   else:
-    print(f"FASTAPI DEBUG (main.py): Reusing CACHED sdk_session_id: {sdk_session_id_for_agent_query} for {stable_agent_user_id}.")
+    log.debug("Reusing CACHED sdk_session_id: %s for %s.", sdk_session_id_for_agent_query, stable_agent_user_id)
+  return sdk_session_id_for_agent_query
+
+def _require_agent_ready(user_input: UserInput):
+  """Shared request preamble; returns (client_managed_session_id, stable_agent_user_id)."""
+  if not _fastapi_agent_service_initialized:
+    raise HTTPException(status_code=503, detail="Agent service not available.")
+  if not (vertex_ai_client and vertex_ai_client.IS_INITIALIZED and vertex_ai_client.REMOTE_AGENT_ENGINE):
+    raise HTTPException(status_code=503, detail="Agent engine component missing.")
+  client_managed_session_id = user_input.session_id or str(uuid.uuid4())
+  stable_agent_user_id = f"web_user_{client_managed_session_id}"
+  if log.isEnabledFor(logging.DEBUG):
+    log.debug("UserInput: query=%r..., client_managed_session_id=%r", user_input.query[:50], client_managed_session_id)
+    log.debug("Derived stable_agent_user_id: %s", stable_agent_user_id)
+  return client_managed_session_id, stable_agent_user_id
+
+@app.post("/chat", response_model=AgentResponse)
+async def chat_with_agent_endpoint(user_input: UserInput):
+  client_managed_session_id, stable_agent_user_id = _require_agent_ready(user_input)
+  sdk_session_id_for_agent_query = _resolve_sdk_session_id(client_managed_session_id, stable_agent_user_id)
 
-  agent_dict_response = process_agent_query(
-      user_query=user_input.query,
-      session_id=sdk_session_id_for_agent_query,
-      user_id=stable_agent_user_id
+  # process_agent_query synchronously drains stream_query; run it off the
+  # event loop so other requests keep being served for the stream's duration.
+  agent_dict_response = await asyncio.to_thread(
+      process_agent_query,
+      user_input.query,
+      sdk_session_id_for_agent_query,
+      stable_agent_user_id,
   )
 
   parsed_itinerary: Optional[Itinerary] = None
   raw_itinerary_data = agent_dict_response.get("structured_itinerary_raw")
   if raw_itinerary_data and isinstance(raw_itinerary_data, dict) and db_available:
     try:
-      # Using Pydantic V2 model_validate, fallback to V1 ** unpacking
-      parsed_itinerary = Itinerary.model_validate(raw_itinerary_data)
+      if TRUSTED_ITINERARY:
+        # The dict was just produced by our own agent; skip revalidation.
+        parsed_itinerary = Itinerary.model_construct(**raw_itinerary_data)
+      else:
+        # Using Pydantic V2 model_validate, fallback to V1 ** unpacking
+        parsed_itinerary = Itinerary.model_validate(raw_itinerary_data)
     except AttributeError: # If model_validate doesn't exist (Pydantic V1)
       parsed_itinerary = Itinerary(**raw_itinerary_data)
     except ValidationError as ve:
@@ -161,13 +246,47 @@ async def chat_with_agent_endpoint(user_input: UserInput):
   )
   return response_payload
 
+@app.post("/chat/stream")
+async def chat_stream_endpoint(user_input: UserInput):
+  """Server-sent-events variant of /chat.
+
+  Emits one 'data:' frame per streamed text delta as the agent produces it,
+  then a terminal 'event: final' frame carrying the same consolidated
+  payload /chat returns, so clients can render tokens immediately instead
+  of waiting out the whole turn.
+  """
+  client_managed_session_id, stable_agent_user_id = _require_agent_ready(user_input)
+  sdk_session_id_for_agent_query = _resolve_sdk_session_id(client_managed_session_id, stable_agent_user_id)
+
+  async def event_source():
+    loop = asyncio.get_running_loop()
+    # The SDK stream is a sync generator; pull each item on the agent-stream
+    # executor so the event loop keeps serving other requests between tokens.
+    sentinel = object()
+    events = vertex_ai_client.stream_agent_query_events(
+        user_input.query, sdk_session_id_for_agent_query, stable_agent_user_id)
+    while True:
+      item = await loop.run_in_executor(None, next, events, sentinel)
+      if item is sentinel:
+        break
+      if item.get("type") == "final":
+        payload = dict(item["payload"])
+        payload["session_id"] = client_managed_session_id
+        yield f"event: final\ndata: {_sse_dumps(payload)}\n\n"
+      else:
+        yield f"data: {_sse_dumps(item)}\n\n"
+
+  return StreamingResponse(event_source(), media_type="text/event-stream")
+
 @app.post("/trips", status_code=201, response_model=Dict[str, str])
 async def save_trip_api_endpoint(save_request: SaveTripRequest):
   global _firestore_client_initialized
   if not _firestore_client_initialized or not db_available:
     raise HTTPException(status_code=503, detail="Database service not available.")
   user_id_for_db = f"db_user_{save_request.client_session_id}"
-  trip_id = save_trip_to_firestore(user_id=user_id_for_db, itinerary=save_request.itinerary_data)
+  # Saves from concurrent requests are coalesced into shared WriteBatch
+  # commits; this awaits until the batch containing our trip has committed.
+  trip_id = await db.trip_write_batcher.submit(user_id_for_db, save_request.itinerary_data)
   if trip_id:
     return {"trip_id": trip_id, "message": "Trip saved successfully."}
   else:
@@ -181,18 +300,16 @@ async def list_trips_api_endpoint(client_session_id: str, status: Optional[str]
   user_id_for_db = f"db_user_{client_session_id}"
   trips_dict_list = get_trips_for_user_from_firestore(user_id=user_id_for_db, status=status)
 
-  # Convert list of dicts to list of TripSummary Pydantic models
-  validated_trips = []
-  for trip_data_dict in trips_dict_list:
-    try:
-      # Pydantic V2: TripSummary.model_validate(trip_data_dict)
-      # Pydantic V1:
-      validated_trips.append(TripSummary(**trip_data_dict))
-    except ValidationError as e:
-      logging.error(f"ERROR (main.py): Invalid data for TripSummary for user {user_id_for_db}: {trip_data_dict}. Error: {e}")
-      # Decide: skip this trip, or raise error, or return partial list?
-      # For now, skipping invalid trip data.
-  return validated_trips
+  # The dicts come straight from our own Firestore writer, so skip
+  # revalidating them and just construct. Binding model_construct once and
+  # building the list in a comprehension keeps the per-trip overhead to the
+  # construct call itself.
+  construct = TripSummary.model_construct
+  try:
+    return [construct(**trip_data_dict) for trip_data_dict in trips_dict_list]
+  except TypeError as e:
+    log.error("Invalid trip data for TripSummary for user %s: %s", user_id_for_db, e)
+    raise HTTPException(status_code=500, detail="Failed to read trips.")
 
 
 @app.get("/trips/{trip_id}", response_model=Optional[Itinerary])
@@ -211,14 +328,20 @@ async def health_check():
   # ... (health check as before, ensuring it checks vertex_ai_client.IS_INITIALIZED) ...
   global _fastapi_agent_service_initialized, _firestore_client_initialized
   client_module_ok = vertex_ai_client and vertex_ai_client.IS_INITIALIZED
+  startup_tasks = getattr(app.state, "startup_tasks", [])
+  still_initializing = any(not task.done() for task in startup_tasks)
   service_status: Dict[str, Any] = {
       "status": "degraded",
       "agent_initialized_in_fastapi": _fastapi_agent_service_initialized,
       "client_module_flag_initialized": client_module_ok,
       "firestore_client_initialized": _firestore_client_initialized,
+      "startup_in_progress": still_initializing,
       "message": []
   }
   all_ok = True
+  if still_initializing:
+    service_status["message"].append("Startup initialization still in progress.")
+    all_ok = False
   if not (_fastapi_agent_service_initialized and client_module_ok):
     service_status["message"].append("Agent service initialization pending or failed.")
     all_ok = False
@@ -238,4 +361,9 @@ async def health_check():
 if __name__ == "__main__":
   import uvicorn
   print("INFO (main.py): Starting Uvicorn server programmatically for development...")
-  uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+  # uvloop + httptools replace the stdlib event loop and h11 parser with
+  # their C implementations; access_log off skips a formatted log line per
+  # request. (workers is ignored when passing an app object, so multi-worker
+  # runs go through the uvicorn CLI with main:app instead.)
+  uvicorn.run(app, host="127.0.0.1", port=8000,
+              loop="uvloop", http="httptools", access_log=False)
\ No newline at end of file
@@ -1,212 +1,262 @@
 import vertexai
 from vertexai import agent_engines
+from collections import deque
+import io
 import os
 import json
 from dotenv import load_dotenv
 from pathlib import Path
 import argparse
-from typing import Dict, Any, Optional, List, Set
+import logging
+from typing import Dict, Any, Optional, List
 import uuid
-import traceback
+
+log = logging.getLogger(__name__)
+
+try:
+    # orjson serializes the event dicts several times faster than stdlib
+    # json; only used on the debugging path, so the fallback costs nothing.
+    import orjson
+    def _dumps_indented(obj: Any) -> str:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+except ImportError:
+    def _dumps_indented(obj: Any) -> str:
+        return json.dumps(obj, indent=2)
 
 # --- Pydantic Model Import (Optional for this script's direct use) ---
 try:
     from travel_concierge.shared_libraries.types import Itinerary as PydanticItinerary
-    print("Successfully imported Pydantic Itinerary model for validation (vertex_ai_client.py).")
+    log.debug("Successfully imported Pydantic Itinerary model for validation.")
 except ImportError:
     PydanticItinerary = None
-    print("Could not import Pydantic Itinerary model in vertex_ai_client.py.")
+    log.warning("Could not import Pydantic Itinerary model in vertex_ai_client.py.")
 # ---
 
+# The per-event parsing helpers live in event_parse.py so they can be
+# AOT-compiled (mypyc/Cython) without touching this module.
+try:
+    from .event_parse import extract_itinerary
+except ImportError: # Running as a script rather than as part of the package.
+    from event_parse import extract_itinerary
+
+import sys
+
+# Interned copies of the per-event keys, same rationale as in event_parse.py:
+# lookups against JSON-decoded dicts become pointer comparisons.
+_K_CONTENT = sys.intern('content')
+_K_PARTS = sys.intern('parts')
+_K_TEXT = sys.intern('text')
+_K_AUTHOR = sys.intern('author')
+_K_SOURCE_AGENT = sys.intern('source_agent')
+_K_SUGGESTIONS = sys.intern('suggestions')
+_K_REQUIRES_FOLLOW_UP = sys.intern('requires_follow_up')
+_K_ERROR = sys.intern('error')
+_K_ERROR_MESSAGE = sys.intern('error_message')
+
 REMOTE_AGENT_ENGINE = None
+# Bound create_session method, resolved once at init; None if the deployed
+# engine doesn't expose it. Callers check this instead of running
+# hasattr + attribute lookup on every new conversation.
+CREATE_SESSION_FN = None
 IS_INITIALIZED = False
 
 def initialize_globals_and_agent() -> bool:
-    global REMOTE_AGENT_ENGINE, IS_INITIALIZED
+    global REMOTE_AGENT_ENGINE, CREATE_SESSION_FN, IS_INITIALIZED
     if IS_INITIALIZED:
-        print("INFO (vertex_ai_client.py): Agent already initialized.")
+        log.info("Agent already initialized.")
         return True
-    print("INFO (vertex_ai_client.py): Starting agent initialization process...")
+    log.info("Starting agent initialization process...")
     try:
         script_dir = Path(__file__).resolve().parent
         dotenv_path = script_dir / '.env'
-        print(f"INFO (vertex_ai_client.py): Attempting to load .env file from: {dotenv_path}")
+        log.info("Attempting to load .env file from: %s", dotenv_path)
         if dotenv_path.is_file():
             load_dotenv(dotenv_path=dotenv_path, verbose=True)
-            print(f"INFO (vertex_ai_client.py): Successfully called load_dotenv for {dotenv_path}.")
+            log.info("Successfully called load_dotenv for %s.", dotenv_path)
         else:
-            print(f"WARNING (vertex_ai_client.py): .env file not found at {dotenv_path}.")
+            log.warning(".env file not found at %s.", dotenv_path)
     except Exception as e:
-        print(f"ERROR (vertex_ai_client.py): Exception during load_dotenv: {e}")
-        traceback.print_exc()
+        log.exception("Exception during load_dotenv: %s", e)
 
     project_id = os.getenv("GOOGLE_CLOUD_PROJECT")
     location = os.getenv("GOOGLE_CLOUD_LOCATION")
     agent_resource_id = os.getenv("REASONING_ENGINE_RESOURCE_NAME")
 
-    print(f"DEBUG (vertex_ai_client.py): GOOGLE_CLOUD_PROJECT: {project_id}")
-    print(f"DEBUG (vertex_ai_client.py): GOOGLE_CLOUD_LOCATION: {location}")
-    print(f"DEBUG (vertex_ai_client.py): REASONING_ENGINE_RESOURCE_NAME: {agent_resource_id}")
-    print(f"DEBUG (vertex_ai_client.py): GOOGLE_APPLICATION_CREDENTIALS (if set): {os.getenv('GOOGLE_APPLICATION_CREDENTIALS')}")
+    log.debug("GOOGLE_CLOUD_PROJECT: %s", project_id)
+    log.debug("GOOGLE_CLOUD_LOCATION: %s", location)
+    log.debug("REASONING_ENGINE_RESOURCE_NAME: %s", agent_resource_id)
+    log.debug("GOOGLE_APPLICATION_CREDENTIALS (if set): %s", os.getenv('GOOGLE_APPLICATION_CREDENTIALS'))
 
     if not all([project_id, location, agent_resource_id]):
-        print("ERROR (vertex_ai_client.py): Missing one or more required environment variables.")
+        log.error("Missing one or more required environment variables.")
         IS_INITIALIZED = False
         return False
     try:
-        print(f"INFO (vertex_ai_client.py): Initializing Vertex AI for project '{project_id}' in location '{location}'.")
+        log.info("Initializing Vertex AI for project '%s' in location '%s'.", project_id, location)
         vertexai.init(project=project_id, location=location)
-        print("INFO (vertex_ai_client.py): vertexai.init() call completed.")
-        print(f"INFO (vertex_ai_client.py): Attempting to get deployed agent: {agent_resource_id}")
+        log.info("vertexai.init() call completed.")
+        log.info("Attempting to get deployed agent: %s", agent_resource_id)
         REMOTE_AGENT_ENGINE = agent_engines.get(agent_resource_id)
         if not REMOTE_AGENT_ENGINE:
-            print(f"ERROR (vertex_ai_client.py): agent_engines.get() returned None for resource: {agent_resource_id}.")
+            log.error("agent_engines.get() returned None for resource: %s.", agent_resource_id)
             IS_INITIALIZED = False
             return False
-        print(f"INFO (vertex_ai_client.py): Successfully retrieved agent: {REMOTE_AGENT_ENGINE.resource_name}")
+        log.info("Successfully retrieved agent: %s", REMOTE_AGENT_ENGINE.resource_name)
+        CREATE_SESSION_FN = getattr(REMOTE_AGENT_ENGINE, 'create_session', None)
+        _warmup_agent_engine()
         IS_INITIALIZED = True
         return True
     except Exception as e:
-        print(f"ERROR (vertex_ai_client.py): Exception during Vertex AI setup: {e}")
-        print("----------- TRACEBACK (vertex_ai_client.py) -----------")
-        traceback.print_exc()
-        print("------------------------------------------------------")
+        log.exception("Exception during Vertex AI setup: %s", e)
         IS_INITIALIZED = False
         return False
 
-def process_agent_query(user_query: str, session_id: Optional[str], user_id: str) -> Dict[str, Any]:
+def _warmup_agent_engine() -> None:
+    """Sends one throwaway query so the first real request doesn't pay cold-start.
+
+    The ping forces TLS/channel setup, auth token exchange and any server-side
+    engine spin-up during startup rather than on the first user turn. Best
+    effort: a failing warmup only logs, it never blocks initialization.
+    """
+    try:
+        log.info("Warming up agent engine with a ping query...")
+        for _ in REMOTE_AGENT_ENGINE.stream_query(message="ping", user_id="warmup"):
+            pass
+        log.info("Agent engine warmup complete.")
+    except Exception as e:
+        log.warning("Agent engine warmup failed (continuing anyway): %s", e)
+
+def stream_agent_query_events(user_query: str, session_id: Optional[str], user_id: str):
+    """Generator variant of process_agent_query.
+
+    Yields {"type": "delta", "text": ...} for each streamed text part as it
+    arrives, then exactly one {"type": "final", "payload": ...} whose payload
+    is the same consolidated dict process_agent_query returns. Callers that
+    only want the final answer should use process_agent_query; this exists
+    so the streaming endpoint can forward tokens without waiting for the
+    whole turn.
+    """
     if not IS_INITIALIZED or not REMOTE_AGENT_ENGINE:
-        error_msg = "Agent not initialized (checked in process_agent_query)."
-        print(f"ERROR (vertex_ai_client.py - process_agent_query): {error_msg}")
-        return {"session_id": session_id, "display_text": error_msg, "error_message": error_msg, "full_event_log": []}
+        error_msg = "Agent not initialized (checked in stream_agent_query_events)."
+        log.error("%s", error_msg)
+        yield {"type": "final", "payload": {"session_id": session_id, "display_text": error_msg, "error_message": error_msg}}
+        return
 
-    collected_display_text_parts: List[str] = []
+    # StringIO grows one internal buffer as text parts arrive, instead of a
+    # list of fragments that ''.join has to walk again at the end.
+    display_text_buf = io.StringIO()
     collected_structured_itinerary: Optional[Dict[str, Any]] = None
+    # Set once a structurally complete itinerary (one carrying 'days') has
+    # been extracted; later events only echo the same state_delta, so the
+    # per-event extraction walk can stop entirely for the rest of the stream.
+    itinerary_locked = False
     collected_suggestions: List[str] = []
-    collected_active_sub_agents: Set[str] = set()
+    # Dict-as-ordered-set: dedupes like a set but keeps first-seen order, so
+    # the reported sub-agent list is deterministic across identical runs.
+    collected_active_sub_agents: Dict[str, None] = {}
     requires_follow_up_flag: bool = False
     error_message_text: Optional[str] = None
-    full_event_log: List[Dict[str, Any]] = []
+    # Bounded ring buffer: the full log is only ever used for debugging empty
+    # responses, so there is no reason to retain (and later serialize) every
+    # event of a long stream.
+    full_event_log: deque = deque(maxlen=32)
 
     try:
         query_args: Dict[str, Any] = {"message": user_query}
         if session_id: query_args["session_id"] = session_id
         if user_id: query_args["user_id"] = user_id
-        print(f"AGENT_CLIENT DEBUG: Query args for stream_query: {query_args}")
-        # Inside process_agent_query function in vertex_ai_client.py
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("Query args for stream_query: %r", query_args)
+
+        # Pre-bind the hot write outside the loop.
+        text_write = display_text_buf.write
 
         for event in REMOTE_AGENT_ENGINE.stream_query(**query_args):
             full_event_log.append(event)
-            # print(f"AGENT_CLIENT RAW_EVENT: {json.dumps(event, indent=2)}") # For deep debug
-
-            # Initialize to keep any previously found itinerary if multiple events update it (unlikely for this key)
-            current_event_itinerary = None
-
-            # 1. Check for itinerary within function_response (tool output)
-            if isinstance(event, dict) and 'content' in event and isinstance(event['content'], dict) and 'parts' in event['content']:
-                for part in event['content']['parts']:
-                    if isinstance(part, dict) and 'text' in part and part['text']:
-                        collected_display_text_parts.append(part['text'])
-
-                    # --- MODIFIED/ADDED BLOCK for tool_code_execution_result / function_response ---
-                    # Check if this part is a function_response for the itinerary_agent
-                    if isinstance(part, dict) and 'function_response' in part:
-                        fn_response = part['function_response']
-                        if isinstance(fn_response, dict) and fn_response.get('name') == 'itinerary_agent':
-                            if 'response' in fn_response and isinstance(fn_response['response'], dict):
-                                # Assuming the direct response is the itinerary object
-                                current_event_itinerary = fn_response['response']
-                                print("AGENT_CLIENT DEBUG: Found itinerary in function_response for itinerary_agent.")
-                                break # Found it in this part
-
-                    # Keep your existing check for 'tool_code_execution_result' just in case
-                    # (though function_response seems to be what ADK uses here)
-                    if isinstance(part, dict) and 'tool_code_execution_result' in part:
-                        tool_output = part['tool_code_execution_result']
-                        # Check if the tool_output itself IS the itinerary (if output_key promotes it)
-                        # OR if it's a dict containing an "itinerary" key
-                        if isinstance(tool_output, dict):
-                            if "itinerary" in tool_output and isinstance(tool_output["itinerary"], dict): # Nested
-                                current_event_itinerary = tool_output["itinerary"]
-                                print("AGENT_CLIENT DEBUG: Found itinerary nested in tool_code_execution_result.")
-                                break
-                            # ADK might also place the output directly if output_key is used and schema matches
-                            # This would require checking if tool_output *is* an itinerary-like dict
-                            # For now, assuming it's nested or in state_delta primarily for output_key.
-                if current_event_itinerary: # If found in parts, use it for this event
-                    collected_structured_itinerary = current_event_itinerary
 
+            if type(event) is not dict:
+                continue
+
+            # Collect display text parts.
+            content = event.get(_K_CONTENT)
+            if type(content) is dict:
+                parts = content.get(_K_PARTS)
+                if type(parts) is list:
+                    for part in parts:
+                        if type(part) is dict:
+                            text = part.get(_K_TEXT)
+                            if text:
+                                text_write(text)
+                                yield {"type": "delta", "text": text}
 
-            # 2. Check for itinerary in state_delta (often the most reliable for output_key)
-            if isinstance(event, dict) and 'actions' in event and isinstance(event['actions'], dict) \
-                and 'state_delta' in event['actions'] and isinstance(event['actions']['state_delta'], dict):
-                state_delta = event['actions']['state_delta']
-                if 'itinerary' in state_delta and isinstance(state_delta['itinerary'], dict):
-                    # Check if it's not empty and looks like a real itinerary
-                    if state_delta['itinerary']: # Ensure it's not just an empty {}
-                        current_event_itinerary = state_delta['itinerary']
-                        print("AGENT_CLIENT DEBUG: Found itinerary in event['actions']['state_delta'].")
-
-            # 3. Your existing checks for common top-level or wrapped keys (fallback)
-            if not current_event_itinerary and isinstance(event, dict): # Only if not found via state_delta
-                if "itinerary" in event and isinstance(event["itinerary"], dict):
-                    if event["itinerary"]: # Ensure not empty
-                        current_event_itinerary = event["itinerary"]
-                        print("AGENT_CLIENT DEBUG: Found itinerary directly in event root.")
-
-                if not current_event_itinerary: # Only if still not found
-                    for key_to_check in ["tool_output", "tool_result", "structured_output", "output"]: # Removed "tool_code_execution_output" as it's handled above
-                        if key_to_check in event and isinstance(event[key_to_check], dict) and \
-                            "itinerary" in event[key_to_check] and isinstance(event[key_to_check]["itinerary"], dict):
-                            if event[key_to_check]["itinerary"]: # Ensure not empty
-                                current_event_itinerary = event[key_to_check]["itinerary"]
-                                print(f"AGENT_CLIENT DEBUG: Found itinerary in event['{key_to_check}'].")
-                                break
-
-            if current_event_itinerary:
-                collected_structured_itinerary = current_event_itinerary # Update with the latest found
-
-            # --- Collect other data (active_sub_agents, suggestions, etc. - keep as is) ---
-            if isinstance(event, dict):
-                if 'author' in event and isinstance(event['author'], str): collected_active_sub_agents.add(event['author'])
-                # ... (rest of your existing logic for suggestions, requires_follow_up, error_message) ...
-                elif 'source_agent' in event and isinstance(event['source_agent'], str): collected_active_sub_agents.add(event['source_agent'])
-                if 'suggestions' in event and isinstance(event['suggestions'], list): collected_suggestions.extend(event['suggestions'])
-                if 'requires_follow_up' in event and isinstance(event['requires_follow_up'], bool): requires_follow_up_flag = event['requires_follow_up']
-                if 'error' in event and isinstance(event['error'], str): error_message_text = event['error']
-                elif 'error_message' in event and isinstance(event['error_message'], str): error_message_text = event['error_message']
+            # Single extraction pass with early exits; keep the latest found
+            # until a complete itinerary locks the slot.
+            if not itinerary_locked:
+                current_event_itinerary = extract_itinerary(event)
+                if current_event_itinerary:
+                    collected_structured_itinerary = current_event_itinerary
+                    if current_event_itinerary.get('days'):
+                        itinerary_locked = True
+
+            # --- Collect other data (active_sub_agents, suggestions, etc.) ---
+            author = event.get(_K_AUTHOR)
+            if type(author) is str:
+                collected_active_sub_agents[author] = None
+            else:
+                source_agent = event.get(_K_SOURCE_AGENT)
+                if type(source_agent) is str:
+                    collected_active_sub_agents[source_agent] = None
+            suggestions = event.get(_K_SUGGESTIONS)
+            if type(suggestions) is list:
+                collected_suggestions.extend(suggestions)
+            requires_follow_up = event.get(_K_REQUIRES_FOLLOW_UP)
+            if type(requires_follow_up) is bool:
+                requires_follow_up_flag = requires_follow_up
+            error = event.get(_K_ERROR)
+            if type(error) is str:
+                error_message_text = error
+            else:
+                error = event.get(_K_ERROR_MESSAGE)
+                if type(error) is str:
+                    error_message_text = error
 
     # ... (rest of the function: final_display_text, debug prints, return statement) ...
     except Exception as e:
         error_message_text = f"ERROR during stream_query: {e}"
-        print(f"\nAGENT_CLIENT ERROR: {error_message_text}")
-        traceback.print_exc()
+        log.exception("%s", error_message_text)
 
-    final_display_text = "".join(collected_display_text_parts)
+    final_display_text = display_text_buf.getvalue()
     if not requires_follow_up_flag and final_display_text.strip().endswith("?"):
         requires_follow_up_flag = True
 
-    #print(f"AGENT_CLIENT DEBUG: Collected display_text_parts: {collected_display_text_parts}")
-    #print(f"AGENT_CLIENT DEBUG: Final display_text: '{final_display_text}'")
-    #print(f"AGENT_CLIENT DEBUG: Full event log: '{full_event_log}'")
-    #print(f"AGENT_CLIENT DEBUG: Collected structured_itinerary_raw: {collected_structured_itinerary}")
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("Final display_text: %r", final_display_text)
+        log.debug("Collected structured_itinerary_raw: %r", collected_structured_itinerary)
 
     if not final_display_text.strip() and not error_message_text:
-        if not full_event_log: print("\nAGENT_CLIENT WARNING: final_display_text is empty AND full_event_log is empty. Stream_query yielded no events.")
+        if not full_event_log:
+            log.warning("final_display_text is empty AND full_event_log is empty. Stream_query yielded no events.")
         else:
-            print("\nAGENT_CLIENT WARNING: final_display_text is empty. Printing full event log for debugging:")
+            log.warning("final_display_text is empty. Logging recent event log for debugging:")
             for i, evt in enumerate(full_event_log):
-                try: print(f"  Event {i}: {json.dumps(evt, indent=2)}")
-                except TypeError: print(f"  Event {i}: (Could not serialize to JSON) {str(evt)}")
-            print("--- End of full event log ---\n")
+                try: log.warning("  Event %d: %s", i, _dumps_indented(evt))
+                except TypeError: log.warning("  Event %d: (Could not serialize to JSON) %s", i, evt)
 
-    return {
+    yield {"type": "final", "payload": {
         "session_id": session_id, # Return the session_id that was *used* for the query
         "display_text": final_display_text,
         "structured_itinerary_raw": collected_structured_itinerary, "suggestions": collected_suggestions,
         "active_sub_agents": list(collected_active_sub_agents), "requires_follow_up": requires_follow_up_flag,
-        "error_message": error_message_text, "full_event_log": full_event_log
-    }
+        "error_message": error_message_text
+    }}
+
+def process_agent_query(user_query: str, session_id: Optional[str], user_id: str) -> Dict[str, Any]:
+    """Drains a full agent turn and returns the consolidated response dict."""
+    payload: Dict[str, Any] = {}
+    for item in stream_agent_query_events(user_query, session_id, user_id):
+        if item["type"] == "final":
+            payload = item["payload"]
+    return payload
 
 def run_cli_chat_loop():
     if not IS_INITIALIZED or not REMOTE_AGENT_ENGINE:
@@ -215,10 +265,10 @@ def run_cli_chat_loop():
     cli_user_id = "interactive_cli_user_001"
     current_cli_session_id: Optional[str] = None
 
-    if hasattr(REMOTE_AGENT_ENGINE, 'create_session'):
+    if CREATE_SESSION_FN is not None:
         try:
             print(f"Attempting to create session for CLI user: {cli_user_id}")
-            session_info = REMOTE_AGENT_ENGINE.create_session(user_id=cli_user_id)
+            session_info = CREATE_SESSION_FN(user_id=cli_user_id)
             returned_id = None
             if isinstance(session_info, dict): returned_id = session_info.get("id")
             elif hasattr(session_info, 'id'): returned_id = session_info.id